@@ -1,9 +1,16 @@
 import streamlit as st
 import preprocessor
 import helper
-import matplotlib.pyplot as plt
-import seaborn as sns
 import pandas as pd
+import hashlib
+import codecs
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional: chardet guesses the encoding of exports that are neither UTF-8 nor BOM-marked
+try:
+    import chardet
+except ImportError:
+    chardet = None
 
 # Set page configuration
 st.set_page_config(
@@ -12,6 +19,87 @@ st.set_page_config(
     layout="wide"
 )
 
+# Cached wrappers so that Streamlit reruns (changing the user, clicking
+# "Show Analysis" again) reuse results for inputs that were already seen.
+# They are keyed on chat_key, a digest of the uploaded bytes computed once per
+# rerun; arguments with a leading underscore are derived from it and not hashed.
+@st.cache_data(show_spinner=False)
+def load_chat(chat_key, _data):
+    """Parse the raw chat export, once per distinct file content, with its per-user row index"""
+    df = preprocessor.preprocess(_data)
+    return df, preprocessor.user_index(df)
+
+# Per-user helpers run for every analysis, by result name
+ANALYSES = {
+    'stats': helper.fetch_stats,
+    'monthly_timeline': helper.monthly_timeline,
+    'daily_timeline': helper.daily_timeline,
+    'week_activity': helper.week_activity_map,
+    'month_activity': helper.month_activity_map,
+    'heatmap': helper.activity_heatmap,
+    'most_common_words': helper.most_common_words,
+    'emojis': helper.emoji_helper,
+}
+
+@st.cache_data(show_spinner=False)
+def run_analyses(chat_key, selected_user, _df, _user_idx):
+    """
+    Run every helper in ANALYSES (plus most_busy_users for 'Overall') and cache the results.
+    _user_idx is preprocessor.user_index(_df), shared by the per-user helpers.
+    
+    For 'Overall' the helpers are independent aggregations over the whole chat, so they
+    run in a thread pool; pandas and numpy release the GIL in most of their kernels.
+    """
+    max_workers = 4 if selected_user == 'Overall' else 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {name: executor.submit(fn, selected_user, _df, _user_idx) for name, fn in ANALYSES.items()}
+        if selected_user == 'Overall':
+            futures['busy_users'] = executor.submit(helper.most_busy_users, _df)
+        return {name: future.result() for name, future in futures.items()}
+
+@st.cache_data(show_spinner=False)
+def wordcloud_image(chat_key, selected_user, _df, _user_idx):
+    """Cached word cloud, stored as an RGB array so it can be pickled"""
+    return helper.create_wordcloud(selected_user, _df, _user_idx).to_array()
+
+# Byte order marks, longest first since the UTF-32 LE mark starts with the UTF-16 LE one
+BOM_ENCODINGS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+def decode_chat(bytes_data):
+    """
+    Decode an uploaded chat export, decoding the bytes only once on every path.
+    
+    A byte order mark wins (exports are often UTF-16 with one), then strict UTF-8.
+    Anything else is guessed by chardet from the first 64 KB when it is installed,
+    and decoded as latin-1 otherwise.
+    
+    Raises:
+        LookupError: If chardet names an encoding Python does not know
+    """
+    for bom, encoding in BOM_ENCODINGS:
+        if bytes_data.startswith(bom):
+            return bytes_data.decode(encoding, errors='replace')
+    
+    try:
+        return bytes_data.decode('utf-8')
+    except UnicodeDecodeError:
+        pass
+    
+    if chardet is None:
+        return bytes_data.decode('latin-1')
+    
+    # A pure-ASCII sample is decoded as UTF-8 since later lines may not be ASCII
+    encoding = chardet.detect(bytes_data[:65536])['encoding']
+    if not encoding or encoding.lower() == 'ascii':
+        encoding = 'utf-8'
+    return bytes_data.decode(encoding, errors='replace')
+
 # Main title
 st.title("WhatsApp Chat Analyzer")
 
@@ -21,20 +109,18 @@ uploaded_file = st.sidebar.file_uploader("Choose a WhatsApp chat export file", t
 if uploaded_file is not None:
     # Read file as string
     bytes_data = uploaded_file.getvalue()
+    chat_key = hashlib.sha256(bytes_data).hexdigest()
+    
     try:
         # Convert bytes to string
-        data = bytes_data.decode("utf-8")
-    except UnicodeDecodeError:
-        try:
-            # Try with different encoding if utf-8 fails
-            data = bytes_data.decode("latin-1")
-        except Exception as e:
-            st.error(f"Error decoding the file: {e}")
-            data = None
+        data = decode_chat(bytes_data)
+    except LookupError as e:
+        st.error(f"Error decoding the file: {e}")
+        data = None
 
     if data:
         # Preprocess the data
-        df = preprocessor.preprocess(data)
+        df, user_idx = load_chat(chat_key, data)
         
         if df.empty:
             st.error("Could not process the chat data. Please make sure you've uploaded a valid WhatsApp chat export file.")
@@ -61,10 +147,16 @@ if uploaded_file is not None:
             
             # Show analysis button
             if st.sidebar.button("Show Analysis"):
+                # Plotting libraries are only imported once there is something to plot,
+                # so the upload page renders without waiting for them
+                import matplotlib.pyplot as plt
+                import seaborn as sns
+                
+                results = run_analyses(chat_key, selected_user, df, user_idx)
                 
                 # Stats
                 st.header("Chat Statistics")
-                num_messages, num_words, num_media, num_links = helper.fetch_stats(selected_user, df)
+                num_messages, num_words, num_media, num_links = results['stats']
                 
                 # Create four columns for stats
                 col1, col2, col3, col4 = st.columns(4)
@@ -83,7 +175,7 @@ if uploaded_file is not None:
                 
                 # Monthly timeline
                 st.header("Monthly Activity")
-                timeline = helper.monthly_timeline(selected_user, df)
+                timeline = results['monthly_timeline']
                 if not timeline.empty:
                     fig, ax = plt.subplots()
                     ax.plot(timeline['time'], timeline['message'], color='green', marker='o')
@@ -95,7 +187,7 @@ if uploaded_file is not None:
                 
                 # Daily timeline
                 st.header("Daily Activity")
-                daily_timeline = helper.daily_timeline(selected_user, df)
+                daily_timeline = results['daily_timeline']
                 if not daily_timeline.empty:
                     fig, ax = plt.subplots()
                     ax.plot(daily_timeline['only_date'], daily_timeline['message'], color='black', marker='o')
@@ -111,7 +203,7 @@ if uploaded_file is not None:
                 
                 with col1:
                     st.subheader("Weekly Activity")
-                    week_activity = helper.week_activity_map(selected_user, df)
+                    week_activity = results['week_activity']
                     if not week_activity.empty:
                         fig, ax = plt.subplots()
                         ax.bar(week_activity.index, week_activity.values, color='purple')
@@ -123,7 +215,7 @@ if uploaded_file is not None:
                 
                 with col2:
                     st.subheader("Monthly Activity")
-                    month_activity = helper.month_activity_map(selected_user, df)
+                    month_activity = results['month_activity']
                     if not month_activity.empty:
                         fig, ax = plt.subplots()
                         ax.bar(month_activity.index, month_activity.values, color='orange')
@@ -135,7 +227,7 @@ if uploaded_file is not None:
                 
                 # Activity heatmap
                 st.header("Weekly Activity Heatmap")
-                heatmap_data = helper.activity_heatmap(selected_user, df)
+                heatmap_data = results['heatmap']
                 if not heatmap_data.empty and not heatmap_data.columns.empty:
                     fig, ax = plt.subplots(figsize=(15, 6))
                     sns.heatmap(heatmap_data, cmap='Greens', linewidths=0.5, ax=ax)
@@ -147,7 +239,7 @@ if uploaded_file is not None:
                 # User activity comparison - Only show for Overall analysis
                 if selected_user == 'Overall':
                     st.header("Most Active Users")
-                    user_counts, percent_df = helper.most_busy_users(df)
+                    user_counts, percent_df = results['busy_users']
                     
                     col1, col2 = st.columns(2)
                     
@@ -170,7 +262,7 @@ if uploaded_file is not None:
                 # Word cloud
                 st.header("Word Cloud")
                 try:
-                    df_wc = helper.create_wordcloud(selected_user, df)
+                    df_wc = wordcloud_image(chat_key, selected_user, df, user_idx)
                     fig, ax = plt.subplots()
                     ax.imshow(df_wc)
                     plt.axis('off')
@@ -180,7 +272,7 @@ if uploaded_file is not None:
                 
                 # Most common words
                 st.header("Most Common Words")
-                most_common_df = helper.most_common_words(selected_user, df)
+                most_common_df = results['most_common_words']
                 if not most_common_df.empty and most_common_df.shape[1] >= 2:
                     # Create a readable dataframe with named columns
                     word_freq_df = pd.DataFrame({
@@ -204,7 +296,7 @@ if uploaded_file is not None:
                 
                 # Emoji analysis
                 st.header("Emoji Analysis")
-                emoji_df = helper.emoji_helper(selected_user, df)
+                emoji_df = results['emojis']
                 if not emoji_df.empty and emoji_df.shape[1] >= 2:
                     # Create columns for emoji display and chart
                     col1, col2 = st.columns(2)
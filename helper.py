@@ -3,48 +3,232 @@ import numpy as np
 from collections import Counter
 import emoji
 import re
-from wordcloud import WordCloud
+import threading
+
+# Regex patterns compiled once at import time
+_URL_RE = re.compile(r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+')
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_WORD_RE = re.compile(r'\S+')
+
+# Single-character emojis; all of them are outside the ASCII range
+_EMOJI_CHARS = frozenset(c for c in emoji.EMOJI_DATA if len(c) == 1)
+
+# Stopwords to filter out common words
+STOPWORDS = set([
+    'the', 'to', 'and', 'is', 'in', 'it', 'of', 'for', 'on', 'that', 'this', 
+    'was', 'with', 'as', 'at', 'by', 'an', 'be', 'are', 'or', 'from', 'had',
+    'have', 'has', 'a', 'i', 'you', 'me', 'we', 'my', 'your', 'our', 'he', 'she',
+    'him', 'her', 'they', 'their', 'am', 'if', 'but', 'so', 'not', 'what', 'when',
+    'where', 'who', 'how', 'why', 'which', 'ok', 'okay', 'yes', 'no', 'can', 'will',
+    'just', 'do', 'did', 'done', 'going', 'go', 'went', 'gone', 'get', 'got', 'getting'
+])
 
 # URL extraction function without external dependencies
 def extract_urls(text):
     """Extract URLs from text using regex"""
-    url_pattern = r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+'
-    return re.findall(url_pattern, text)
+    return _URL_RE.findall(text)
+
+def _select_user(selected_user, df, user_idx=None):
+    """
+    Get the rows of the chat sent by one user
+    
+    Args:
+        selected_user (str): User to filter by, or 'Overall' for all users
+        df (pd.DataFrame): Preprocessed chat DataFrame
+        user_idx (dict, optional): preprocessor.user_index(df), to avoid a full scan
+        
+    Returns:
+        pd.DataFrame: The selected user's messages
+    """
+    if selected_user == 'Overall':
+        return df
+    
+    if user_idx is None:
+        return df[df['user'] == selected_user]
+    
+    return df.iloc[user_idx.get(selected_user, [])]
 
-def fetch_stats(selected_user, df):
+def _word_counts(df):
+    """
+    Count words across all messages, skipping stopwords and non-alphabetic tokens.
+    Shared by the word cloud and the most common words table.
+    
+    Args:
+        df (pd.DataFrame): Chat DataFrame already filtered to the messages to count
+        
+    Returns:
+        Counter: Word frequencies
+    """
+    # Clean the messages in bulk, then stream their words straight into the Counter
+    # instead of materializing one long Series of every token
+    # (non-string values become NaN in the .str methods and are dropped).
+    # Compiled patterns have no pyarrow kernel, so work on plain Python strings
+    # rather than let pandas fall back (and warn) on an arrow-backed column
+    clean_messages = df['message'].astype(object).str.lower().str.replace(_PUNCT_RE, ' ', regex=True).dropna()
+    words = (
+        word
+        for message in clean_messages
+        for word in message.split()
+        if word.isalpha() and word not in STOPWORDS
+    )
+    
+    return Counter(words)
+
+def _arrow_buffers(messages):
+    """
+    Get the raw UTF-8 buffers behind an arrow-backed string Series.
+    
+    Args:
+        messages (pd.Series): Message column
+        
+    Returns:
+        tuple: (offsets array, uint8 data array), or None if the column is not arrow-backed
+    """
+    array = getattr(messages.dropna().array, '_pa_array', None)
+    if array is None:
+        return None
+    
+    array = array.combine_chunks()
+    _, offsets_buf, data_buf = array.buffers()
+    offset_type = np.int64 if str(array.type) == 'large_string' else np.int32
+    offsets = np.frombuffer(offsets_buf, dtype=offset_type)[array.offset:array.offset + len(array) + 1]
+    data = np.frombuffer(data_buf, dtype=np.uint8) if data_buf is not None else np.zeros(0, dtype=np.uint8)
+    
+    return offsets, data
+
+def _count_words_links(offsets, buf):
+    """
+    Count words (whitespace-separated runs) and http(s):// links in one
+    serial pass over the UTF-8 bytes of every pure-ASCII message.
+    
+    Which non-ASCII characters count as whitespace or word characters is Unicode
+    data the kernel does not have, so messages with any non-ASCII byte are
+    skipped and flagged for the _WORD_RE/_URL_RE path instead.
+    
+    Runs single-threaded on purpose: numba's default workqueue threading layer
+    aborts the process when parallel kernels are launched from several threads,
+    which Streamlit sessions and app.run_analyses both do.
+    
+    Returns:
+        tuple: (words, links, boolean array of the skipped non-ASCII messages)
+    """
+    num_words = 0
+    num_links = 0
+    non_ascii = np.zeros(len(offsets) - 1, dtype=np.bool_)
+    for i in range(len(offsets) - 1):
+        start = offsets[i]
+        end = offsets[i + 1]
+        words = 0
+        links = 0
+        in_word = False
+        # Bytes before url_end belong to the last link, which _URL_RE would have consumed
+        url_end = start
+        for j in range(start, end):
+            b = buf[j]
+            if b >= 0x80:
+                non_ascii[i] = True
+                break
+            
+            is_space = b == 32 or 9 <= b <= 13 or 28 <= b <= 31
+            if not is_space and not in_word:
+                words += 1
+            in_word = not is_space
+            
+            # 'http', optional 's', '://' and then as many URL characters as _URL_RE takes
+            if j >= url_end and b == 104 and j + 7 < end and buf[j + 1] == 116 and buf[j + 2] == 116 and buf[j + 3] == 112:
+                k = j + 4
+                if buf[k] == 115:
+                    k += 1
+                if k + 3 < end and buf[k] == 58 and buf[k + 1] == 47 and buf[k + 2] == 47:
+                    m = k + 3
+                    while m < end:
+                        c = buf[m]
+                        # '-', '.', '_' or [0-9A-Za-z]
+                        if (c == 45 or c == 46 or c == 95
+                                or 48 <= c <= 57 or 65 <= c <= 90 or 97 <= c <= 122):
+                            m += 1
+                        # '%' followed by two hex digits
+                        elif (c == 37 and m + 2 < end
+                                and (48 <= buf[m + 1] <= 57 or 65 <= buf[m + 1] <= 70 or 97 <= buf[m + 1] <= 102)
+                                and (48 <= buf[m + 2] <= 57 or 65 <= buf[m + 2] <= 70 or 97 <= buf[m + 2] <= 102)):
+                            m += 3
+                        else:
+                            break
+                    if m > k + 3:
+                        links += 1
+                        url_end = m
+        
+        if not non_ascii[i]:
+            num_words += words
+            num_links += links
+    return num_words, num_links, non_ascii
+
+# Compiled kernel, built on first use so importing helper never pays for numba
+# (False once numba turned out to be unavailable)
+_kernel = None
+_kernel_lock = threading.Lock()
+
+def _words_links_kernel():
+    """
+    Get the numba-compiled _count_words_links, importing numba on first use.
+    
+    Returns:
+        callable: Compiled kernel, or None if numba is not installed
+    """
+    global _kernel
+    with _kernel_lock:
+        if _kernel is None:
+            try:
+                import numba
+            except ImportError:
+                _kernel = False
+            else:
+                _kernel = numba.njit(cache=True)(_count_words_links)
+    return _kernel or None
+
+def fetch_stats(selected_user, df, user_idx=None):
     """
     Extract basic statistics from the chat data
     
     Args:
         selected_user (str): User to filter by, or 'Overall' for all users
         df (pd.DataFrame): Preprocessed chat DataFrame
+        user_idx (dict, optional): preprocessor.user_index(df), to avoid a full scan
         
     Returns:
         tuple: (number of messages, number of words, number of media messages, number of links)
     """
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    df = _select_user(selected_user, df, user_idx)
     
     # Total messages
     num_messages = df.shape[0]
     
-    # Total words
-    words = []
-    for message in df['message']:
-        if isinstance(message, str):  # Check if message is a string
-            words.extend(message.split())
-    
     # Media messages (check for different formats)
-    media_patterns = ['<Media omitted>', '<Media omitted>\n']
-    num_media_messages = df[df['message'].isin(media_patterns)].shape[0]
+    num_media_messages = int(df['is_media'].sum())
+    
+    # Words and links: one fused pass over the arrow buffer when numba is available,
+    # leaving only the non-ASCII messages it skips to the regexes below
+    messages = df['message']
+    num_words = num_links = 0
+    buffers = _arrow_buffers(messages)
+    kernel = _words_links_kernel() if buffers is not None else None
+    if kernel is not None:
+        num_words, num_links, non_ascii = kernel(*buffers)
+        num_words, num_links = int(num_words), int(num_links)
+        messages = messages.dropna()[non_ascii]
+    
+    # Python's re on plain strings, not pyarrow's RE2 (whose \w is ASCII-only),
+    # so links with non-ASCII hosts count the same as in extract_urls
+    messages = messages.astype(object)
+    
+    # Total words, counted without materializing the tokens
+    # (non-string values yield NaN and are skipped by sum)
+    num_words += int(messages.str.count(_WORD_RE).sum())
     
     # Links shared
-    links = []
-    for message in df['message']:
-        if isinstance(message, str):  # Check if message is a string
-            links.extend(extract_urls(message))
+    num_links += int(messages.str.count(_URL_RE).sum())
     
-    return num_messages, len(words), num_media_messages, len(links)
+    return num_messages, num_words, num_media_messages, num_links
 
 def most_busy_users(df):
     """
@@ -60,64 +244,64 @@ def most_busy_users(df):
         return pd.Series(), pd.DataFrame(columns=['User', 'Percent'])
     
     # Drop group notifications
-    chat_df = df[df['user'] != 'group_notification']
+    chat_df = df[~df['is_notification']]
     
     if chat_df.empty:
         return pd.Series(), pd.DataFrame(columns=['User', 'Percent'])
     
-    # Count messages by user
-    x = chat_df['user'].value_counts().head(10)
+    # Count messages by user (a categorical column also reports users left with no messages)
+    user_counts = chat_df['user'].value_counts()
+    user_counts = user_counts[user_counts > 0]
+    x = user_counts.head(10)
     
     # Calculate percentages
-    df_percent = round((chat_df['user'].value_counts() / chat_df.shape[0]) * 100, 2).reset_index()
+    df_percent = round((user_counts / chat_df.shape[0]) * 100, 2).reset_index()
     df_percent.columns = ['User', 'Percent']
     
     return x, df_percent
 
-def create_wordcloud(selected_user, df):
+def create_wordcloud(selected_user, df, user_idx=None):
     """
     Generate a wordcloud from chat messages
     
     Args:
         selected_user (str): User to filter by, or 'Overall' for all users
         df (pd.DataFrame): Preprocessed chat DataFrame
+        user_idx (dict, optional): preprocessor.user_index(df), to avoid a full scan
         
     Returns:
         WordCloud: Generated wordcloud object
     """
+    # Imported here so that loading this module does not pull in wordcloud
+    from wordcloud import WordCloud
+    
     if df.empty or 'user' not in df.columns or 'message' not in df.columns:
         # Return an empty WordCloud if data is invalid
         return WordCloud(width=500, height=500, min_font_size=10, background_color='white').generate(" ")
     
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    df = _select_user(selected_user, df, user_idx)
     
-    # Drop group notifications
-    df = df[df['user'] != 'group_notification']
-    
-    # Remove media messages (check both formats)
-    media_patterns = ['<Media omitted>', '<Media omitted>\n']
-    df = df[~df['message'].isin(media_patterns)]
+    # Drop group notifications and media messages
+    df = df[~df['is_media'] & ~df['is_notification']]
     
     if df.empty:
         return WordCloud(width=500, height=500, min_font_size=10, background_color='white').generate(" ")
     
-    # Combine all messages, handling non-string values
-    text = " ".join([msg for msg in df['message'] if isinstance(msg, str)])
-    
-    # Generate wordcloud
+    # Generate wordcloud straight from the word frequencies instead of
+    # joining every message into one string for WordCloud to re-tokenize
     wc = WordCloud(width=500, height=500, min_font_size=10, background_color='white')
-    df_wc = wc.generate(text)
+    df_wc = wc.generate_from_frequencies(_word_counts(df))
     
     return df_wc
 
-def monthly_timeline(selected_user, df):
+def monthly_timeline(selected_user, df, user_idx=None):
     """
     Generate monthly timeline of messages
     
     Args:
         selected_user (str): User to filter by, or 'Overall' for all users
         df (pd.DataFrame): Preprocessed chat DataFrame
+        user_idx (dict, optional): preprocessor.user_index(df), to avoid a full scan
         
     Returns:
         pd.DataFrame: Timeline with message counts by month and year
@@ -125,24 +309,24 @@ def monthly_timeline(selected_user, df):
     if df.empty or not all(col in df.columns for col in ['user', 'year', 'month', 'message']):
         return pd.DataFrame(columns=['year', 'month', 'message', 'time'])
     
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    df = _select_user(selected_user, df, user_idx)
     
     # Group by month and year
-    timeline = df.groupby(['year', 'month']).count()['message'].reset_index()
+    timeline = df.groupby(['year', 'month'], observed=True).size().reset_index(name='message')
     
     # Create a unified time column for plotting
-    timeline['time'] = timeline['month'] + ' ' + timeline['year'].astype(str)
+    timeline['time'] = timeline['month'].astype(str) + ' ' + timeline['year'].astype(str)
     
     return timeline
 
-def daily_timeline(selected_user, df):
+def daily_timeline(selected_user, df, user_idx=None):
     """
     Generate daily timeline of messages
     
     Args:
         selected_user (str): User to filter by, or 'Overall' for all users
         df (pd.DataFrame): Preprocessed chat DataFrame
+        user_idx (dict, optional): preprocessor.user_index(df), to avoid a full scan
         
     Returns:
         pd.DataFrame: Timeline with message counts by date
@@ -150,21 +334,21 @@ def daily_timeline(selected_user, df):
     if df.empty or not all(col in df.columns for col in ['user', 'only_date', 'message']):
         return pd.DataFrame(columns=['only_date', 'message'])
     
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    df = _select_user(selected_user, df, user_idx)
     
     # Group by date
-    daily_timeline = df.groupby('only_date').count()['message'].reset_index()
+    daily_timeline = df.groupby('only_date').size().reset_index(name='message')
     
     return daily_timeline
 
-def week_activity_map(selected_user, df):
+def week_activity_map(selected_user, df, user_idx=None):
     """
     Count messages by day of week
     
     Args:
         selected_user (str): User to filter by, or 'Overall' for all users
         df (pd.DataFrame): Preprocessed chat DataFrame
+        user_idx (dict, optional): preprocessor.user_index(df), to avoid a full scan
         
     Returns:
         pd.Series: Message counts by day of week
@@ -172,22 +356,21 @@ def week_activity_map(selected_user, df):
     if df.empty or 'day_name' not in df.columns:
         return pd.Series()
     
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    df = _select_user(selected_user, df, user_idx)
     
-    # Sort by weekday (Monday to Sunday)
-    weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    day_counts = df['day_name'].value_counts().reindex(weekday_order, fill_value=0)
+    # The ordered categorical keeps weekday order (Monday to Sunday), including empty days
+    day_counts = df['day_name'].value_counts(sort=False)
     
     return day_counts
 
-def month_activity_map(selected_user, df):
+def month_activity_map(selected_user, df, user_idx=None):
     """
     Count messages by month
     
     Args:
         selected_user (str): User to filter by, or 'Overall' for all users
         df (pd.DataFrame): Preprocessed chat DataFrame
+        user_idx (dict, optional): preprocessor.user_index(df), to avoid a full scan
         
     Returns:
         pd.Series: Message counts by month
@@ -195,23 +378,21 @@ def month_activity_map(selected_user, df):
     if df.empty or 'month' not in df.columns:
         return pd.Series()
     
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    df = _select_user(selected_user, df, user_idx)
     
-    # Sort by month order
-    month_order = ['January', 'February', 'March', 'April', 'May', 'June', 
-                  'July', 'August', 'September', 'October', 'November', 'December']
-    month_counts = df['month'].value_counts().reindex(month_order, fill_value=0)
+    # The ordered categorical keeps calendar month order, including empty months
+    month_counts = df['month'].value_counts(sort=False)
     
     return month_counts
 
-def activity_heatmap(selected_user, df):
+def activity_heatmap(selected_user, df, user_idx=None):
     """
     Create a heatmap of activity by day of week and hour period
     
     Args:
         selected_user (str): User to filter by, or 'Overall' for all users
         df (pd.DataFrame): Preprocessed chat DataFrame
+        user_idx (dict, optional): preprocessor.user_index(df), to avoid a full scan
         
     Returns:
         pd.DataFrame: Pivot table with counts by day and hour period
@@ -221,31 +402,22 @@ def activity_heatmap(selected_user, df):
         weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
         return pd.DataFrame(index=weekday_order)
     
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
-    
-    # Weekday ordering for better visualization
-    weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    df = _select_user(selected_user, df, user_idx)
     
-    pivot_table = df.pivot_table(
-        index='day_name',
-        columns='period',
-        values='message',
-        aggfunc='count'
-    ).fillna(0)
-    
-    # Reindex with proper day order
-    pivot_table = pivot_table.reindex(weekday_order)
+    # Count on the categorical codes; dropna=False keeps every day (in weekday
+    # order) and every hour period, filling the missing ones with 0
+    pivot_table = pd.crosstab(df['day_name'], df['period'], dropna=False)
     
     return pivot_table
 
-def most_common_words(selected_user, df):
+def most_common_words(selected_user, df, user_idx=None):
     """
     Find the most commonly used words in the chat
     
     Args:
         selected_user (str): User to filter by, or 'Overall' for all users
         df (pd.DataFrame): Preprocessed chat DataFrame
+        user_idx (dict, optional): preprocessor.user_index(df), to avoid a full scan
         
     Returns:
         pd.DataFrame: DataFrame with word frequencies
@@ -253,47 +425,27 @@ def most_common_words(selected_user, df):
     if df.empty or 'message' not in df.columns:
         return pd.DataFrame(columns=[0, 1])
     
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    df = _select_user(selected_user, df, user_idx)
     
     # Filter out media messages and group notifications
-    df = df[df['user'] != 'group_notification']
-    media_patterns = ['<Media omitted>', '<Media omitted>\n']
-    df = df[~df['message'].isin(media_patterns)]
-    
-    # Define stopwords to filter out common words
-    stopwords = set([
-        'the', 'to', 'and', 'is', 'in', 'it', 'of', 'for', 'on', 'that', 'this', 
-        'was', 'with', 'as', 'at', 'by', 'an', 'be', 'are', 'or', 'from', 'had',
-        'have', 'has', 'a', 'i', 'you', 'me', 'we', 'my', 'your', 'our', 'he', 'she',
-        'him', 'her', 'they', 'their', 'am', 'if', 'but', 'so', 'not', 'what', 'when',
-        'where', 'who', 'how', 'why', 'which', 'ok', 'okay', 'yes', 'no', 'can', 'will',
-        'just', 'do', 'did', 'done', 'going', 'go', 'went', 'gone', 'get', 'got', 'getting'
-    ])
-    
-    words = []
-    for message in df['message']:
-        if isinstance(message, str):
-            # Clean the message and split into words
-            clean_message = re.sub(r'[^\w\s]', ' ', message.lower())
-            message_words = [word for word in clean_message.split() if word.isalpha() and word not in stopwords]
-            words.extend(message_words)
+    df = df[~df['is_media'] & ~df['is_notification']]
     
     # Get most common words
-    most_common_df = pd.DataFrame(Counter(words).most_common(20))
+    most_common_df = pd.DataFrame(_word_counts(df).most_common(20))
     
     if most_common_df.empty:
         return pd.DataFrame(columns=[0, 1])
     
     return most_common_df
 
-def emoji_helper(selected_user, df):
+def emoji_helper(selected_user, df, user_idx=None):
     """
     Extract emoji usage statistics
     
     Args:
         selected_user (str): User to filter by, or 'Overall' for all users
         df (pd.DataFrame): Preprocessed chat DataFrame
+        user_idx (dict, optional): preprocessor.user_index(df), to avoid a full scan
         
     Returns:
         pd.DataFrame: DataFrame with emoji frequencies
@@ -301,18 +453,18 @@ def emoji_helper(selected_user, df):
     if df.empty or 'message' not in df.columns:
         return pd.DataFrame(columns=[0, 1])
     
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
-    
-    emojis = []
-    for message in df['message']:
-        if isinstance(message, str):
-            # Extract emojis from message
-            emoji_list = [c for c in message if c in emoji.EMOJI_DATA]
-            emojis.extend(emoji_list)
-    
-    # Get emoji counts
-    emoji_counter = Counter(emojis)
+    df = _select_user(selected_user, df, user_idx)
+    
+    # Count single-character emojis; pure-ASCII messages (usually most of them)
+    # cannot contain any, so str.isascii() lets us skip them without a per-character scan.
+    # Iterate plain Python strings: an arrow-backed column would box each element separately
+    emoji_counter = Counter(
+        c
+        for message in df['message'].astype(object).dropna()
+        if isinstance(message, str) and not message.isascii()
+        for c in message
+        if c in _EMOJI_CHARS
+    )
     
     # Create DataFrame with emoji counts
     emoji_df = pd.DataFrame(emoji_counter.most_common(10))
@@ -1,7 +1,164 @@
 import re
 import pandas as pd
+import numpy as np
 import io
 
+# Different WhatsApp date-time patterns to try, compiled once at import time
+# (the second group captures the time including any AM/PM marker)
+_DATE_PATTERNS = [
+    # Standard format: 25/04/23, 15:49 - Name: Message (or 4/25/23, 3:49 PM - ...)
+    re.compile(r'(\d{1,2}/\d{1,2}/\d{2,4}),\s(\d{1,2}:\d{2}(?::\d{2})?(?:\s[AP]M)?)\s-\s'),
+    
+    # Bracketed format: [04/25/23, 3:49:21 PM] Name: Message
+    re.compile(r'\[(\d{1,2}/\d{1,2}/\d{2,4}),\s(\d{1,2}:\d{2}(?::\d{2})?(?:\s[AP]M)?)\]\s'),
+    
+    # Date with dots: 25.04.2023, 15:49 - Name: Message
+    re.compile(r'(\d{1,2}\.\d{1,2}\.\d{2,4}),\s(\d{1,2}:\d{2}(?::\d{2})?(?:\s[AP]M)?)\s-\s'),
+    
+    # Format with dashes: 2023-04-25, 15:49 - Name: Message
+    re.compile(r'(\d{4}-\d{1,2}-\d{1,2}),\s(\d{1,2}:\d{2}(?::\d{2})?(?:\s[AP]M)?)\s-\s')
+]
+
+# Invisible marks that may precede a header: iOS exports put a left-to-right mark
+# before attachment and system lines, and the first line may carry a BOM
+_HEADER_PREFIX_MARKS = '\u200e\u200f\ufeff'
+
+# Candidate formats of the "date, time" string captured by each of _DATE_PATTERNS,
+# most likely first; slash dates may be day-first or month-first depending on locale
+_TIMES_24H = ['%H:%M', '%H:%M:%S']
+_TIMES_12H = ['%I:%M %p', '%I:%M:%S %p']
+_DATE_FORMATS = [
+    [f'{d}, {t}' for d in ['%d/%m/%y', '%m/%d/%y', '%d/%m/%Y', '%m/%d/%Y'] for t in _TIMES_24H + _TIMES_12H],
+    [f'{d}, {t}' for d in ['%m/%d/%y', '%d/%m/%y', '%m/%d/%Y', '%d/%m/%Y'] for t in _TIMES_12H + _TIMES_24H],
+    [f'{d}, {t}' for d in ['%d.%m.%Y', '%d.%m.%y'] for t in _TIMES_24H + _TIMES_12H],
+    [f'{d}, {t}' for d in ['%Y-%m-%d'] for t in _TIMES_24H + _TIMES_12H]
+]
+
+# "Name: " prefix separating the sender from the message text
+_USER_RE = re.compile(r'^(.*?):\s')
+
+# Calendar orderings for the categorical day and month columns
+WEEKDAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTH_ORDER = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December']
+
+# Message bodies WhatsApp writes in place of attachments
+MEDIA_PATTERNS = ['<Media omitted>', '<Media omitted>\n']
+
+# Hourly period labels ('00-01' ... '23-00'), indexed by hour
+PERIOD_LABELS = np.array([f"{h:02d}-{(h+1)%24:02d}" for h in range(24)])
+
+def user_index(df):
+    """
+    Map each user to the positions of their rows in a preprocessed DataFrame,
+    so the per-user helpers can select a user without comparing every row.
+    
+    The positions are only valid for df itself; pass them along with that frame.
+    
+    Args:
+        df (pd.DataFrame): Preprocessed chat DataFrame
+        
+    Returns:
+        dict: user name -> numpy array of row positions (empty if df has no users)
+    """
+    # preprocess returns an empty frame without columns for unparseable input
+    if df.empty or 'user' not in df.columns:
+        return {}
+    
+    return df.groupby('user', observed=True).indices
+
+def _iter_lines(data):
+    """
+    Yield the lines of a string one at a time, keeping their line endings.
+    
+    Unlike str.splitlines, this never holds a list of all lines in memory.
+    """
+    start = 0
+    while start < len(data):
+        end = data.find('\n', start) + 1 or len(data)
+        yield data[start:end]
+        start = end
+
+def _parse_dates(values, formats=_DATE_FORMATS[0]):
+    """
+    Convert date strings to datetimes, leaving unparseable values as NaT.
+    
+    A single format is always used for the whole column, so day-first and
+    month-first dates are never mixed within one chat.
+    
+    Args:
+        values (pd.Series): Date strings to convert
+        formats (list): Explicit formats to try in order; the first one that
+            parses every value is used, otherwise the closest one if it misses
+            at most 10% of the values
+        
+    Returns:
+        pd.Series: Parsed datetimes
+    """
+    best_missing, best_dates = None, None
+    sample = values.iloc[:100]
+    
+    for fmt in formats:
+        # Skip formats that fit none of the first messages before parsing everything
+        if pd.to_datetime(sample, format=fmt, errors='coerce').isna().all():
+            continue
+        
+        # cache=True parses each distinct timestamp string only once
+        dates = pd.to_datetime(values, format=fmt, errors='coerce', cache=True)
+        missing = dates.isna().mean()
+        if missing == 0:
+            return dates
+        if best_missing is None or missing < best_missing:
+            best_missing, best_dates = missing, dates
+    
+    if best_missing is not None and best_missing <= 0.1:
+        return best_dates
+    
+    # No candidate fits well enough: let pandas infer one format for the column
+    return pd.to_datetime(values, errors='coerce', cache=True, dayfirst=True)
+
+def _add_features(df):
+    """
+    Add the time-based feature columns and message flags used by the analysis helpers.
+    
+    Args:
+        df (pd.DataFrame): DataFrame with parsed 'date', 'user' and 'message' columns
+        
+    Returns:
+        pd.DataFrame: The same DataFrame with the feature columns added
+    """
+    # Extract time-based features
+    df['only_date'] = df['date'].dt.date
+    df['year'] = df['date'].dt.year
+    df['month_num'] = df['date'].dt.month
+    df['month'] = df['date'].dt.month_name()
+    df['day'] = df['date'].dt.day
+    df['day_name'] = df['date'].dt.day_name()
+    df['hour'] = df['date'].dt.hour
+    df['minute'] = df['date'].dt.minute
+    
+    # Create hourly period labels: the hour itself is the category code
+    df['period'] = pd.Categorical.from_codes(df['hour'].to_numpy(), categories=PERIOD_LABELS)
+    
+    # Media / group notification flags, computed once and reused by the helpers
+    df['is_media'] = df['message'].isin(MEDIA_PATTERNS)
+    df['is_notification'] = df['user'] == 'group_notification'
+    
+    # Categorical columns let groupby/value_counts work on integer codes
+    # instead of hashing strings; day and month also keep calendar order
+    df['user'] = df['user'].astype('category')
+    df['day_name'] = pd.Categorical(df['day_name'], categories=WEEKDAY_ORDER, ordered=True)
+    df['month'] = pd.Categorical(df['month'], categories=MONTH_ORDER, ordered=True)
+    
+    # Arrow-backed strings keep all messages in one contiguous buffer, which the
+    # .str methods can scan directly; keep plain Python strings without pyarrow
+    try:
+        df['message'] = df['message'].astype('string[pyarrow]')
+    except ImportError:
+        pass
+    
+    return df
+
 def preprocess(data):
     """
     Preprocess WhatsApp chat data into a structured pandas DataFrame.
@@ -12,91 +169,49 @@ def preprocess(data):
     Returns:
         pd.DataFrame: Structured DataFrame with message data and time-based features
     """
-    if not isinstance(data, str) or not data.strip():
+    if not isinstance(data, str) or not data or data.isspace():
         print("Error: Input data is empty or not a string")
         return pd.DataFrame()
     
-    # List of different WhatsApp date-time patterns to try
-    patterns = [
-        # Standard format: 25/04/23, 15:49 - Name: Message
-        r'(\d{1,2}/\d{1,2}/\d{2,4}),\s(\d{1,2}:\d{2}(?::\d{2})?)(?:\s[AP]M)?\s-\s',
-        
-        # Bracketed format: [04/25/23, 3:49:21 PM] Name: Message
-        r'\[(\d{1,2}/\d{1,2}/\d{2,4}),\s(\d{1,2}:\d{2}(?::\d{2})?)(?:\s[AP]M)?\]\s',
-        
-        # Date with dots: 25.04.2023, 15:49 - Name: Message
-        r'(\d{1,2}\.\d{1,2}\.\d{2,4}),\s(\d{1,2}:\d{2}(?::\d{2})?)(?:\s[AP]M)?\s-\s',
-        
-        # Format with dashes: 2023-04-25, 15:49 - Name: Message
-        r'(\d{4}-\d{1,2}-\d{1,2}),\s(\d{1,2}:\d{2}(?::\d{2})?)(?:\s[AP]M)?\s-\s'
-    ]
-    
-    # Date formats to try for conversion
-    date_formats = [
-        '%d/%m/%Y, %H:%M', '%m/%d/%Y, %H:%M', 
-        '%d/%m/%y, %H:%M', '%m/%d/%y, %H:%M',
-        '%d/%m/%Y, %H:%M:%S', '%m/%d/%Y, %H:%M:%S',
-        '%d/%m/%Y, %I:%M %p', '%m/%d/%Y, %I:%M %p',
-        '%d.%m.%Y, %H:%M', '%d.%m.%y, %H:%M',
-        '%Y-%m-%d, %H:%M', '%Y-%m-%d, %H:%M:%S'
-    ]
-    
     # Try each pattern
-    for pattern_idx, pattern in enumerate(patterns):
+    for pattern_idx, pattern in enumerate(_DATE_PATTERNS):
         try:
-            # Split the chat by the pattern
-            splits = re.split(pattern, data)
-            
-            # Extract date and time matches
-            date_time_matches = re.findall(pattern, data)
-            
-            if not date_time_matches or len(date_time_matches) == 0:
-                continue
-                
-            # Build the messages and dates lists
+            # Build the messages and dates lists in a single line-by-line pass:
+            # a line starting with a date-time header opens a new message, any
+            # other line continues the current (multi-line) message
+            # (text before the first header is often empty/irrelevant and is dropped)
             messages = []
             dates = []
+            current_lines = None
             
-            # We should have triplets in splits after pattern split: [before_match, date, time, message, ...]
-            # First element is often empty/irrelevant text
-            if len(splits) > 1:
-                for i in range(0, len(splits) - 2, 3):
-                    if i + 2 < len(splits):
-                        date_part = splits[i + 1]
-                        time_part = splits[i + 2]
-                        message_part = splits[i + 3]
-                        
-                        dates.append(f"{date_part}, {time_part}")
-                        messages.append(message_part)
+            for line in _iter_lines(data):
+                # Match the header after any leading directional marks or BOM
+                match = pattern.match(line, len(line) - len(line.lstrip(_HEADER_PREFIX_MARKS)))
+                if match:
+                    if current_lines is not None:
+                        messages.append(''.join(current_lines))
+                    dates.append(f"{match.group(1)}, {match.group(2)}")
+                    current_lines = [line[match.end():]]
+                elif current_lines is not None:
+                    current_lines.append(line)
             
-            if len(dates) == 0 or len(messages) == 0:
+            if current_lines is None:
                 continue
-                
-            if len(dates) != len(messages):
-                # Ensure lists have the same length
-                min_len = min(len(dates), len(messages))
-                dates = dates[:min_len]
-                messages = messages[:min_len]
+            messages.append(''.join(current_lines))
             
             # Create DataFrame
             df = pd.DataFrame({'message_date': dates, 'user_message': messages})
             
-            # Try to convert dates with different formats
-            datetime_conversion_success = False
-            for fmt in date_formats:
-                try:
-                    df['date'] = pd.to_datetime(df['message_date'], format=fmt)
-                    datetime_conversion_success = True
-                    break
-                except ValueError:
-                    continue
+            # Convert dates, dropping messages whose date could not be parsed
+            df['date'] = _parse_dates(df['message_date'], _DATE_FORMATS[pattern_idx])
+            df = df.dropna(subset=['date'])
             
-            if not datetime_conversion_success:
+            if df.empty:
                 continue
             
             # Extract users and messages
-            df['user'] = df['user_message'].str.extract(r'^(.*?):\s', expand=False)
-            df['message'] = df['user_message'].str.replace(r'^.*?:\s', '', regex=True)
+            df['user'] = df['user_message'].str.extract(_USER_RE, expand=False)
+            df['message'] = df['user_message'].str.replace(_USER_RE, '', regex=True)
             
             # Handle group notifications and messages without a username
             mask = df['user'].isna()
@@ -106,18 +221,7 @@ def preprocess(data):
             # Clean up the DataFrame
             df = df.drop(columns=['message_date', 'user_message'])
             
-            # Extract time-based features
-            df['only_date'] = df['date'].dt.date
-            df['year'] = df['date'].dt.year
-            df['month_num'] = df['date'].dt.month
-            df['month'] = df['date'].dt.month_name()
-            df['day'] = df['date'].dt.day
-            df['day_name'] = df['date'].dt.day_name()
-            df['hour'] = df['date'].dt.hour
-            df['minute'] = df['date'].dt.minute
-            
-            # Create hourly period labels
-            df['period'] = df['hour'].apply(lambda h: f"{h:02d}-{(h+1)%24:02d}")
+            df = _add_features(df)
             
             # Check if we have a valid dataframe with required columns
             if len(df) > 0 and all(col in df.columns for col in ['date', 'user', 'message']):
@@ -157,25 +261,10 @@ def preprocess(data):
                     df = df[['date', 'user', 'message']]
                     
                     # Try to convert date column
-                    for fmt in date_formats:
-                        try:
-                            df['date'] = pd.to_datetime(df['date'], format=fmt)
-                            break
-                        except:
-                            continue
-                    
-                    # Extract time-based features
-                    df['only_date'] = df['date'].dt.date
-                    df['year'] = df['date'].dt.year
-                    df['month_num'] = df['date'].dt.month
-                    df['month'] = df['date'].dt.month_name()
-                    df['day'] = df['date'].dt.day
-                    df['day_name'] = df['date'].dt.day_name()
-                    df['hour'] = df['date'].dt.hour
-                    df['minute'] = df['date'].dt.minute
+                    df['date'] = _parse_dates(df['date'])
+                    df = df.dropna(subset=['date'])
                     
-                    # Create hourly period labels
-                    df['period'] = df['hour'].apply(lambda h: f"{h:02d}-{(h+1)%24:02d}")
+                    df = _add_features(df)
                     
                     if len(df) > 0:
                         return df